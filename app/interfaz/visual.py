@@ -8,36 +8,49 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 # Tu motor y modelos
-from app.modelos import DispositivoInput, TipoDispositivo, Sintoma, NivelCriticidad
-from app.reglas import BaseConocimiento
+from app.modelos import (
+    DispositivoInput, Sintoma, NivelCriticidad,
+    TIPOS_LIST, SINTOMAS_LIST, TIPO_POR_VALOR, SINTOMA_POR_VALOR,
+)
+from app.plantillas import crear_entorno_jinja
+from app.reglas import get_base_conocimiento
 
 # --- Rutas absolutas para que no dependan del cwd ---
 INTERFAZ_DIR = Path(__file__).resolve().parent              # .../app/interfaz
 TEMPLATES_DIR = INTERFAZ_DIR / "templates"                  # app/interfaz/templates
 STATIC_DIR = INTERFAZ_DIR / "static"                        # app/interfaz/static
+JINJA_CACHE_DIR = INTERFAZ_DIR / ".jinja_cache"             # bytecode de templates compilados
 
 app = FastAPI(title="Interfaz IoT")
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+
+# Templates con bytecode cache en disco y precompilados (ver app/plantillas.py)
+templates = Jinja2Templates(env=crear_entorno_jinja(TEMPLATES_DIR, JINJA_CACHE_DIR))
 
 # Instancia única del motor
-BC = BaseConocimiento()
+BC = get_base_conocimiento()
 
 # ---------- Helpers ----------
 def _parse_float(s: Optional[str]) -> Optional[float]:
-    if s is None or str(s).strip() == "":
+    if not s:
+        return None
+    s = s.strip() if isinstance(s, str) else str(s).strip()
+    if not s:
         return None
     try:
-        return float(str(s).replace(",", "."))
-    except Exception:
+        return float(s.replace(",", "."))
+    except ValueError:
         return None
 
 def _parse_int(s: Optional[str]) -> Optional[int]:
-    if s is None or str(s).strip() == "":
+    if not s:
+        return None
+    s = s.strip() if isinstance(s, str) else str(s).strip()
+    if not s:
         return None
     try:
-        return int(str(s))
-    except Exception:
+        return int(s)
+    except ValueError:
         return None
 
 # ---------- Rutas ----------
@@ -47,35 +60,35 @@ def healthz():
 
 from fastapi.responses import HTMLResponse, PlainTextResponse
 
+# Template de inicio: se resuelve una sola vez al importar (el layout no cambia)
+HOME_CANDIDATOS = ("index.html", "admin.kb.html")
+HOME_TEMPLATE = next((t for t in HOME_CANDIDATOS if (TEMPLATES_DIR / t).exists()), None)
+HOME_ARCHIVOS = [p.name for p in TEMPLATES_DIR.glob('*.html')]
+HOME_CONTEXTO = {
+    # pasamos con TODOS los nombres típicos por compatibilidad
+    "tipos": TIPOS_LIST,
+    "device_types": TIPOS_LIST,   # alias
+    "sintomas": SINTOMAS_LIST,
+    "symptoms": SINTOMAS_LIST,    # alias
+}
+
+
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
-    # Probar en este orden
-    candidatos = ["index.html", "admin.kb.html"]
-    contexto_base = {
-        "request": request,
-        # pasamos con TODOS los nombres típicos por compatibilidad
-        "tipos": list(TipoDispositivo),
-        "device_types": list(TipoDispositivo),   # alias
-        "sintomas": list(Sintoma),
-        "symptoms": list(Sintoma),               # alias
-    }
-    for tpl in candidatos:
-        if (TEMPLATES_DIR / tpl).exists():
-            try:
-                return templates.TemplateResponse(tpl, contexto_base)
-            except Exception as e:
-                # Mostrar error de Jinja claramente en el navegador
-                return PlainTextResponse(
-                    f"Error renderizando {tpl}:\n{type(e).__name__}: {e}",
-                    status_code=500,
-                )
-
-    archivos = [p.name for p in TEMPLATES_DIR.glob('*.html')]
-    return HTMLResponse(
-        f"<h3>No encontré ninguno de {candidatos} en {TEMPLATES_DIR}</h3>"
-        f"<p>Encontré: {archivos}</p>",
-        status_code=404,
-    )
+    if HOME_TEMPLATE is None:
+        return HTMLResponse(
+            f"<h3>No encontré ninguno de {list(HOME_CANDIDATOS)} en {TEMPLATES_DIR}</h3>"
+            f"<p>Encontré: {HOME_ARCHIVOS}</p>",
+            status_code=404,
+        )
+    try:
+        return templates.TemplateResponse(HOME_TEMPLATE, {"request": request, **HOME_CONTEXTO})
+    except Exception as e:
+        # Mostrar error de Jinja claramente en el navegador
+        return PlainTextResponse(
+            f"Error renderizando {HOME_TEMPLATE}:\n{type(e).__name__}: {e}",
+            status_code=500,
+        )
 
 
 @app.post("/diagnosticar", response_class=HTMLResponse)
@@ -97,22 +110,12 @@ async def diagnosticar(
     dias_on = _parse_int(tiempo_encendido_dias)
 
     # Mapear enums desde valores string del form
-    try:
-        tipo_enum = TipoDispositivo(tipo)
-    except Exception:
-        # fallback al primero si viene mal
-        tipo_enum = list(TipoDispositivo)[0]
-
-    sintomas_enum: List[Sintoma] = []
-    for s in sintomas:
-        try:
-            sintomas_enum.append(Sintoma(s))
-        except Exception:
-            # ignorar síntomas desconocidos
-            pass
+    # (fallback al primer tipo si viene mal; síntomas desconocidos se ignoran)
+    tipo_enum = TIPO_POR_VALOR.get(tipo, TIPOS_LIST[0])
+    sintomas_enum: List[Sintoma] = [SINTOMA_POR_VALOR[s] for s in sintomas if s in SINTOMA_POR_VALOR]
     if not sintomas_enum:
         # al menos uno para que el motor tenga con qué trabajar
-        sintomas_enum = [list(Sintoma)[0]]
+        sintomas_enum = [SINTOMAS_LIST[0]]
 
     # Construir el dispositivo respetando tu modelo
     kwargs: Dict[str, Any] = dict(
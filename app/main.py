@@ -11,23 +11,37 @@
 
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-from collections import Counter
+from collections import Counter, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
-import json, os, tempfile, shutil
+from functools import lru_cache
+from types import MappingProxyType
+import asyncio, gzip, json, mimetypes, os, tempfile, threading
 
+import anyio
+import orjson
 from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.modelos import (
     DispositivoInput,
+    FactoresDispositivoInput,
     Resultado,
     TipoDispositivo,
     Sintoma,
     NivelCriticidad,
+    TIPOS_LIST,
+    SINTOMAS_LIST,
+    TIPO_POR_VALOR,
+    SINTOMA_POR_VALOR,
 )
-from app.reglas import BaseConocimiento
+from app.plantillas import crear_entorno_jinja
+from app.reglas import DIAS_ENCENDIDO_LARGO, clave_diagnostico, get_base_conocimiento
 
 
 # -------------------------------------------------------------------
@@ -37,25 +51,212 @@ BASE_DIR     = Path(__file__).resolve().parent          # app/
 TEMPLATE_DIR = BASE_DIR / "templates"                   # app/templates
 STATIC_DIR   = BASE_DIR / "static"                      # app/static
 DATA_DIR     = BASE_DIR / "data"                        # app/data
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"             # bytecode de templates compilados
 
 KB_PATH      = DATA_DIR / "base_conocimiento.json"      # matriz de reglas editable
-CASES_PATH   = DATA_DIR / "casos_no_diagnosticados.json"  # historial de casos/diag
+CASES_PATH   = DATA_DIR / "casos_no_diagnosticados.jsonl" # historial de casos/diag (1 caso por línea)
+LEGACY_CASES_PATH = DATA_DIR / "casos_no_diagnosticados.json"  # formato viejo (lista JSON)
 
 
 # -------------------------------------------------------------------
 # Inicializar FastAPI, static y templates
 # -------------------------------------------------------------------
+@asynccontextmanager
+async def _ciclo_de_vida(app: FastAPI):
+    """
+    Arranque/apagado: genera los .gz de static que falten, levanta el
+    escritor de casos en segundo plano y, al apagar, lo frena y baja a disco lo que haya quedado en la cola.
+    """
+    await anyio.to_thread.run_sync(_precomprimir_static, STATIC_DIR)
+    tarea = asyncio.create_task(_escritor_casos())
+    _ESCRITOR["tarea"] = tarea
+    try:
+        yield
+    finally:
+        _ESCRITOR["tarea"] = None
+        tarea.cancel()
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+        await anyio.to_thread.run_sync(_vaciar_cola_casos)
+
+
 app = FastAPI(
     title="SISTEMA EXPERTO IoT",
     description="API para diagnóstico inteligente de dispositivos IoT",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=_ciclo_de_vida,
 )
 
-# servir CSS y assets
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# -------------------------------------------------------------------
+# Static precomprimidos + caché larga en el navegador
+# -------------------------------------------------------------------
+STATIC_COMPRIMIBLES = {".css", ".js", ".svg", ".html"}
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
-# motor de plantillas HTML (Jinja2)
-TEMPLATES = Jinja2Templates(directory=str(TEMPLATE_DIR))
+def _precomprimir_static(directorio: Path) -> None:
+    """
+    Genera <archivo>.gz junto a cada asset de texto (si falta o quedó viejo),
+    así el servidor no comprime en cada request. Si en el deploy se generan
+    también .br, se sirven con prioridad.
+    """
+    for f in directorio.rglob("*"):
+        if f.suffix not in STATIC_COMPRIMIBLES or not f.is_file():
+            continue
+        gz = f.with_suffix(f.suffix + ".gz")
+        if gz.exists() and gz.stat().st_mtime_ns >= f.stat().st_mtime_ns:
+            continue
+        try:
+            _atomic_write_bytes(
+                gz,
+                gzip.compress(f.read_bytes(), compresslevel=9, mtime=0),
+                mode=f.stat().st_mode & 0o777,   # mismos permisos que el original
+            )
+        except OSError:
+            pass  # sin permisos de escritura: se sirve sin comprimir
+
+
+def _encodings_aceptados(header: str) -> set:
+    """
+    Parsea Accept-Encoding y devuelve las codificaciones aceptadas (q > 0).
+    Respeta "gzip;q=0" (rechazo explícito) y el comodín "*".
+    """
+    aceptadas, rechazadas = set(), set()
+    for parte in header.split(","):
+        nombre, *params = parte.split(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for param in params:
+            clave, _, valor = param.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        (aceptadas if q > 0 else rechazadas).add(nombre)
+    if "*" in aceptadas:
+        aceptadas |= {"br", "gzip"} - rechazadas
+    return aceptadas
+
+
+class StaticComprimidos(StaticFiles):
+    """
+    StaticFiles que sirve la variante .br/.gz precomprimida cuando el cliente
+    la acepta, y marca todo con Cache-Control de un año (los templates
+    agregan ?v=STATIC_VERSION para invalidar).
+    """
+    async def get_response(self, path: str, scope) -> Response:
+        aceptadas: set = set()
+        for k, v in scope.get("headers", ()):
+            if k == b"accept-encoding":
+                aceptadas = _encodings_aceptados(v.decode("latin-1"))
+                break
+
+        for sufijo, encoding in ((".br", "br"), (".gz", "gzip")):
+            if encoding not in aceptadas:
+                continue
+            try:
+                resp = await super().get_response(path + sufijo, scope)
+            except StarletteHTTPException:
+                continue  # no hay variante comprimida de este archivo
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            resp.headers["content-type"] = media_type
+            resp.headers["content-encoding"] = encoding
+            resp.headers["vary"] = "Accept-Encoding"
+            resp.headers["cache-control"] = STATIC_CACHE_CONTROL
+            return resp
+
+        resp = await super().get_response(path, scope)
+        resp.headers["cache-control"] = STATIC_CACHE_CONTROL
+        if Path(path).suffix in STATIC_COMPRIMIBLES:
+            # la versión sin comprimir también depende de Accept-Encoding
+            resp.headers["vary"] = "Accept-Encoding"
+        return resp
+
+
+# versión de los assets para cache-busting (?v=...): cambia si cambia algún archivo
+STATIC_VERSION = format(
+    max(
+        (f.stat().st_mtime_ns for f in STATIC_DIR.rglob("*")
+         if f.is_file() and f.suffix not in {".gz", ".br"}),
+        default=0,
+    ),
+    "x",
+)
+
+# servir CSS y assets (los .gz se generan al arrancar, ver _ciclo_de_vida)
+app.mount("/static", StaticComprimidos(directory=STATIC_DIR), name="static")
+
+
+class GZipRespetandoQ(GZipMiddleware):
+    """
+    GZipMiddleware que no comprime si el cliente rechaza gzip con q=0
+    (el original solo busca el texto "gzip" en Accept-Encoding).
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and "gzip" not in _encodings_aceptados(
+            Headers(scope=scope).get("accept-encoding", "")
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# gzip al vuelo sólo para respuestas dinámicas grandes
+# (los static ya llevan content-encoding y el middleware los deja pasar)
+app.add_middleware(GZipRespetandoQ, minimum_size=1000)
+
+# motor de plantillas HTML (Jinja2), ver app/plantillas.py
+TEMPLATES = Jinja2Templates(env=crear_entorno_jinja(TEMPLATE_DIR, JINJA_CACHE_DIR))
+TEMPLATES.env.globals["STATIC_VERSION"] = STATIC_VERSION
+
+
+# -------------------------------------------------------------------
+# Caché en memoria de archivos parseados (invalidada por mtime)
+# -------------------------------------------------------------------
+# path -> ((st_mtime_ns, st_size), contenido parseado)
+_CACHE: Dict[Path, tuple] = {}
+
+
+def _file_key(path: Path) -> Optional[tuple]:
+    """
+    Firma barata del archivo (un solo stat). None si no existe.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cache_get(path: Path, key: Optional[tuple]):
+    """
+    Devuelve (True, contenido) si la caché sigue vigente para esa firma.
+    """
+    hit = _CACHE.get(path)
+    if hit is not None and key is not None and hit[0] == key:
+        return True, hit[1]
+    return False, None
+
+
+def _cache_put(path: Path, data):
+    """
+    Guarda `data` como contenido vigente del archivo tal como está ahora.
+    Los escritores lo llaman después de escribir, así la próxima lectura
+    no vuelve a parsear lo que acabamos de guardar.
+    """
+    key = _file_key(path)
+    if key is None:
+        _CACHE.pop(path, None)
+    else:
+        _CACHE[path] = (key, data)
 
 
 # -------------------------------------------------------------------
@@ -65,36 +266,103 @@ def _read_json_safe(path: Path, default):
     """
     Lee un archivo JSON y devuelve su contenido.
     Si no existe o está corrupto, devuelve `default`.
+    Mientras el archivo no cambie, devuelve el objeto ya parseado.
     """
-    if not path.exists():
+    key = _file_key(path)
+    if key is None:
         return default
+    ok, data = _cache_get(path, key)
+    if ok:
+        return data
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+        raw = path.read_bytes()
+    except OSError:
         return default
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # orjson es estricto (rechaza NaN/Infinity que json.dump sí escribía):
+        # reintentamos con el json estándar antes de darlo por corrupto
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return default
+    _CACHE[path] = (key, data)
+    return data
 
 
-def atomic_write_json(path: Path, payload: dict | list):
+def _atomic_write_bytes(
+    path: Path, data: bytes, durable: bool = False, mode: Optional[int] = None
+):
     """
     Escritura segura:
-    1. Escribe en un archivo temporal.
-    2. Mueve ese archivo temporal al destino.
+    1. Escribe en un archivo temporal (en la misma carpeta → mismo filesystem).
+    2. Lo renombra sobre el destino con os.replace (un solo rename atómico).
     Evita archivos corruptos si la app se interrumpe en medio.
+
+    durable=True además hace fsync del archivo y de la carpeta, así el cambio
+    sobrevive a un corte de luz. Es caro: solo para la KB, no para el log.
+
+    mode: permisos del archivo final (mkstemp lo crea en 0600).
     """
     path.parent.mkdir(parents=True, exist_ok=True)
-    fd, tmp = tempfile.mkstemp(prefix="kb_", suffix=".json", dir=str(path.parent))
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
-        shutil.move(tmp, path)
-    finally:
-        # cleanup por las dudas
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+        if durable:
+            _fsync_dir(path.parent)
+    except BaseException:
+        # falló antes del rename: no dejamos el temporal tirado
         try:
-            if os.path.exists(tmp):
-                os.remove(tmp)
-        except Exception:
+            os.remove(tmp)
+        except OSError:
             pass
+        raise
+
+
+def _fsync_dir(directorio: Path):
+    """
+    fsync de la carpeta para persistir el rename (no disponible en Windows).
+    """
+    try:
+        dfd = os.open(str(directorio), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dfd)
+
+
+def atomic_write_json(path: Path, payload: dict | list, durable: bool = False):
+    """
+    Guarda `payload` como JSON indentado de forma atómica.
+    El JSON se serializa entero con orjson y se escribe en un solo write().
+    """
+    _atomic_write_bytes(
+        path,
+        orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS),
+        durable=durable,
+    )
+    _cache_put(path, payload)
+
+
+def atomic_write_json_durable(path: Path, payload: dict | list):
+    """
+    Igual que atomic_write_json pero con fsync: lo usa la KB, donde perder
+    una edición del admin no es aceptable. El historial de casos es
+    best-effort (append sin fsync) porque se escribe en cada diagnóstico.
+    """
+    atomic_write_json(path, payload, durable=True)
 
 
 def read_kb() -> Dict[str, Any]:
@@ -130,8 +398,96 @@ def read_kb() -> Dict[str, Any]:
 def write_kb(kb: Dict[str, Any]):
     """
     Guarda la KB en disco de forma atómica.
+    No toca los diagnósticos memoizados: el admin edita 'sintomas' y
+    'dispositivos', que el motor no relee (usa las reglas que cargó al
+    arrancar), así que la memo sigue siendo válida.
+
+    `kb` suele ser el mismo dict cacheado que devolvió read_kb() y ya viene
+    modificado; si la escritura falla se descarta esa copia (y el índice)
+    para que la edición no quede "fantasma" en memoria.
     """
-    atomic_write_json(KB_PATH, kb)
+    try:
+        atomic_write_json_durable(KB_PATH, kb)
+    except Exception:
+        _CACHE.pop(KB_PATH, None)
+        _KB_INDICE["kb"] = None
+        _KB_INDICE["causas"] = {}
+        raise
+
+
+# Índice secundario de la KB: {codigo: {causa_normalizada: posición}}.
+# read_kb() devuelve el mismo dict mientras el archivo no cambie, así que
+# el índice se reconstruye solo cuando cambia esa identidad.
+_KB_LOCK = threading.Lock()
+_KB_INDICE: Dict[str, Any] = {"kb": None, "causas": {}}
+
+
+def _normalizar_causa(causa: str) -> str:
+    return causa.strip().lower()
+
+
+def _indice_causas(kb: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """
+    Devuelve el índice de causas por síntoma para `kb` (O(1) para saber si
+    una causa ya existe). Se recalcula solo si la KB en memoria es otra.
+    """
+    if _KB_INDICE["kb"] is not kb:
+        causas_por_codigo: Dict[str, Dict[str, int]] = {}
+        for codigo, datos in kb["sintomas"].items():
+            idx: Dict[str, int] = {}
+            for i, c in enumerate(datos.get("causas", [])):
+                clave = _normalizar_causa(c.get("causa", ""))
+                # si la KB (editada a mano) repite una causa, vale la primera
+                if clave not in idx:
+                    idx[clave] = i
+            causas_por_codigo[codigo] = idx
+        _KB_INDICE["causas"] = causas_por_codigo
+        _KB_INDICE["kb"] = kb
+    return _KB_INDICE["causas"]
+
+
+# -------------------------------------------------------------------
+# Historial de casos (JSON Lines: un caso por línea)
+# -------------------------------------------------------------------
+# Los appends corren en threads (anyio.to_thread): el lock serializa
+# escritura + actualización de la caché en memoria. Es reentrante para
+# que las operaciones de admin puedan leer-modificar-escribir adentro.
+_CASES_LOCK = threading.RLock()
+
+
+def _read_cases() -> List[dict]:
+    """
+    Lee el historial de casos (JSONL).
+    Las líneas vacías o corruptas se saltean sin romper la lectura.
+    Mientras el archivo no cambie, devuelve la lista ya parseada.
+    """
+    with _CASES_LOCK:
+        key = _file_key(CASES_PATH)
+        if key is None:
+            return []
+        ok, casos = _cache_get(CASES_PATH, key)
+        if ok:
+            return casos
+        casos = []
+        for linea in CASES_PATH.read_bytes().splitlines():
+            if not linea.strip():
+                continue
+            try:
+                casos.append(orjson.loads(linea))
+            except orjson.JSONDecodeError:
+                continue
+        _CACHE[CASES_PATH] = (key, casos)
+        return casos
+
+
+def _write_cases(casos: List[dict]):
+    """
+    Reescribe el historial completo de forma atómica.
+    Solo lo usan las operaciones de admin (borrar uno / limpiar todo).
+    """
+    with _CASES_LOCK:
+        _atomic_write_bytes(CASES_PATH, b"".join(orjson.dumps(c) + b"\n" for c in casos))
+        _cache_put(CASES_PATH, casos)
 
 
 def _append_case(payload: dict):
@@ -139,16 +495,217 @@ def _append_case(payload: dict):
     Agrega un caso diagnosticado al historial que usamos para:
     - /casos/diagnosticados
     - /api/stats
+    Es un append de una línea: no se relee ni reescribe el historial.
+    """
+    _append_cases_bulk([payload])
+
+
+def _append_cases_bulk(payloads: List[dict]):
+    """
+    Agrega varios casos de una sola vez (un open + un write).
+    Lo usa /diagnosticar/lote para no abrir el archivo por cada ítem.
+    """
+    if not payloads:
+        return
+    with _CASES_LOCK:
+        CASES_PATH.parent.mkdir(parents=True, exist_ok=True)
+        key_antes = _file_key(CASES_PATH)
+        if key_antes is None:
+            vigente, casos = True, []
+        else:
+            vigente, casos = _cache_get(CASES_PATH, key_antes)
+
+        with open(CASES_PATH, "ab") as f:
+            f.write(b"".join(orjson.dumps(p) + b"\n" for p in payloads))
+
+        if vigente:
+            # la caché estaba al día: sumamos los casos en memoria y
+            # actualizamos la firma, así /api/casos no vuelve a parsear
+            casos.extend(payloads)
+            _cache_put(CASES_PATH, casos)
+            _stats_sumar_lote(payloads)
+        else:
+            # otro proceso tocó el archivo: se reparsea y las métricas se
+            # recalculan desde el archivo (sumar solo este lote las desfasa)
+            _CACHE.pop(CASES_PATH, None)
+            _stats_rebuild()
+
+
+def _migrar_casos_legacy():
+    """
+    Migración única: si existe el historial viejo (lista JSON) y todavía
+    no hay JSONL, lo convierte y deja el original como .bak.
+    """
+    if CASES_PATH.exists() or not LEGACY_CASES_PATH.exists():
+        return
+    casos = _read_json_safe(LEGACY_CASES_PATH, default=[])
+    if not isinstance(casos, list):
+        casos = []
+    _write_cases(casos)
+    LEGACY_CASES_PATH.replace(LEGACY_CASES_PATH.with_suffix(".json.bak"))
+
+
+_migrar_casos_legacy()
+
+
+# -------------------------------------------------------------------
+# Escritura diferida de casos (group commit)
+# -------------------------------------------------------------------
+# Los endpoints encolan el caso y responden; una tarea de fondo junta lo
+# encolado cada ESCRITOR_INTERVALO segundos y lo escribe en un solo append.
+# /api/stats y /api/casos pueden tardar hasta ese intervalo en reflejarlo.
+# Sin la tarea corriendo (p. ej. TestClient sin `with`) se escribe directo.
+ESCRITOR_INTERVALO = 0.05
+_COLA_CASOS: deque = deque()
+_ESCRITOR: Dict[str, Any] = {"tarea": None}
+
+
+def _vaciar_cola_casos():
+    """
+    Saca todo lo encolado y lo agrega al historial en una sola escritura.
+    Vacía la cola bajo _CASES_LOCK (RLock, así delete_caso puede llamarla
+    con el lock tomado): un reset no puede colarse entre sacar y escribir.
+    """
+    with _CASES_LOCK:
+        lote = list(_COLA_CASOS)
+        _COLA_CASOS.clear()
+        _append_cases_bulk(lote)
+
+
+async def _escritor_casos():
+    """
+    Tarea de fondo: cada ESCRITOR_INTERVALO baja la cola a disco (en un thread).
+    """
+    while True:
+        await asyncio.sleep(ESCRITOR_INTERVALO)
+        if not _COLA_CASOS:
+            continue
+        try:
+            await anyio.to_thread.run_sync(_vaciar_cola_casos)
+        except Exception:
+            # si falla el log, seguimos igual (no tiramos abajo la tarea)
+            pass
+
+
+async def _registrar_casos(casos: List[dict]):
+    """
+    Registra casos para /stats y /casos sin bloquear el request:
+    con el escritor activo solo se encolan; si no, se escriben en un thread.
+    """
+    if not casos:
+        return
+    if _ESCRITOR["tarea"] is not None:
+        _COLA_CASOS.extend(casos)
+    else:
+        await anyio.to_thread.run_sync(_append_cases_bulk, casos)
+
+
+# -------------------------------------------------------------------
+# Métricas incrementales para /api/stats
+# -------------------------------------------------------------------
+# Se reconstruyen una vez al arrancar y después se actualizan en cada
+# alta/baja de caso, así /api/stats no recorre todo el historial.
+# Todo acceso va bajo _CASES_LOCK (el mismo que protege el historial).
+_STATS: Dict[str, Any] = {
+    "n": 0,
+    "by_device": Counter(),
+    "by_symptom": Counter(),
+    "by_category": Counter(),
+    "by_criticidad": Counter(),
+}
+
+# Cuerpos JSON ya serializados de /api/stats y /api/casos.
+# - "stats": bytes o None; se invalida en cada alta/baja de caso.
+# - "casos": (firma del archivo, bytes); vale mientras no cambie la firma.
+_RESPUESTAS: Dict[str, Any] = {"stats": None, "casos": None}
+
+
+def _stats_claves(caso: dict):
     """
-    casos = _read_json_safe(CASES_PATH, default=[])
-    casos.append(payload)
-    atomic_write_json(CASES_PATH, casos)
+    Devuelve los pares (contador, clave) que aporta un caso a las métricas.
+    """
+    td = caso.get("tipo_dispositivo")
+    if td:
+        yield "by_device", td
+    for s in caso.get("sintomas", []):
+        yield "by_symptom", s
+    cat = caso.get("categoria_top")
+    if cat:
+        yield "by_category", cat
+    crit = caso.get("criticidad")
+    if crit:
+        yield "by_criticidad", crit
+
+
+def _stats_sumar_lote(casos: List[dict]):
+    """
+    Suma varios casos de una vez: cada Counter recibe un solo update()
+    con todas sus claves (el conteo lo hace Counter en C).
+    """
+    if not casos:
+        return
+    _RESPUESTAS["stats"] = None
+    _STATS["n"] += len(casos)
+    _STATS["by_device"].update(
+        td for c in casos if (td := c.get("tipo_dispositivo"))
+    )
+    _STATS["by_symptom"].update(
+        s for c in casos for s in c.get("sintomas", [])
+    )
+    _STATS["by_category"].update(
+        cat for c in casos if (cat := c.get("categoria_top"))
+    )
+    _STATS["by_criticidad"].update(
+        crit for c in casos if (crit := c.get("criticidad"))
+    )
+
+
+def _stats_restar(caso: dict):
+    _RESPUESTAS["stats"] = None
+    _STATS["n"] = max(_STATS["n"] - 1, 0)
+    for nombre, clave in _stats_claves(caso):
+        contador = _STATS[nombre]
+        contador[clave] -= 1
+        if contador[clave] <= 0:
+            del contador[clave]
+
+
+def _stats_reset():
+    _RESPUESTAS["stats"] = None
+    _STATS["n"] = 0
+    for nombre in ("by_device", "by_symptom", "by_category", "by_criticidad"):
+        _STATS[nombre].clear()
+
+
+def _stats_rebuild():
+    """
+    Recalcula las métricas desde cero escaneando el historial (arranque).
+    Una sola pasada por Counter en vez de un += 1 por clave y por caso.
+    """
+    with _CASES_LOCK:
+        _stats_reset()
+        _stats_sumar_lote(_read_cases())
+
+
+_stats_rebuild()
 
 
 # -------------------------------------------------------------------
 # Motor del sistema experto
 # -------------------------------------------------------------------
-base_conocimiento = BaseConocimiento()
+base_conocimiento = get_base_conocimiento()
+
+
+# Textos fijos: se calculan una sola vez al importar el módulo.
+# MappingProxyType: vista de solo lectura (nadie la modifica por accidente)
+SINTOMA_DESCRIPCIONES = MappingProxyType({
+    Sintoma.NO_RESPONDE: "El dispositivo no reacciona a comandos ni muestra actividad.",
+    Sintoma.ERROR_CONEXION: "Fallas recurrentes al conectar con WiFi o servidor cloud.",
+    Sintoma.REINICIOS_FRECUENTES: "El dispositivo se apaga y enciende sin intervención.",
+    Sintoma.CONSUMO_ANOMALO: "Consumo eléctrico fuera de especificaciones normales.",
+    Sintoma.LATENCIA_ALTA: "Retardo superior a 2 segundos en responder comandos.",
+    Sintoma.FALLA_AUTENTICACION: "Errores de login, tokens inválidos o acceso denegado.",
+})
 
 
 def obtener_descripcion_sintoma(sintoma: Sintoma) -> str:
@@ -156,15 +713,109 @@ def obtener_descripcion_sintoma(sintoma: Sintoma) -> str:
     Texto amigable para mostrar al usuario humano en el formulario.
     (Esto es puramente de presentación.)
     """
-    descripciones = {
-        Sintoma.NO_RESPONDE: "El dispositivo no reacciona a comandos ni muestra actividad.",
-        Sintoma.ERROR_CONEXION: "Fallas recurrentes al conectar con WiFi o servidor cloud.",
-        Sintoma.REINICIOS_FRECUENTES: "El dispositivo se apaga y enciende sin intervención.",
-        Sintoma.CONSUMO_ANOMALO: "Consumo eléctrico fuera de especificaciones normales.",
-        Sintoma.LATENCIA_ALTA: "Retardo superior a 2 segundos en responder comandos.",
-        Sintoma.FALLA_AUTENTICACION: "Errores de login, tokens inválidos o acceso denegado.",
+    return SINTOMA_DESCRIPCIONES.get(sintoma, "Sin descripción.")
+
+
+# Respuestas de /sintomas y /dispositivos (no cambian en runtime)
+SINTOMAS_PAYLOAD = {
+    "sintomas": [
+        {
+            "valor": s.value,
+            "nombre": s.name,
+            "descripcion": obtener_descripcion_sintoma(s),
+        }
+        for s in SINTOMAS_LIST
+    ]
+}
+
+DISPOSITIVOS_PAYLOAD = {
+    "dispositivos": [
+        {"tipo": t.value, "nombre": t.name}
+        for t in TIPOS_LIST
+    ]
+}
+
+# ya serializados: el endpoint devuelve los bytes tal cual
+SINTOMAS_JSON = orjson.dumps(SINTOMAS_PAYLOAD)
+DISPOSITIVOS_JSON = orjson.dumps(DISPOSITIVOS_PAYLOAD)
+
+
+# -------------------------------------------------------------------
+# Núcleo compartido de diagnóstico (/diagnosticar, /lote y /resultado)
+# -------------------------------------------------------------------
+# Cuántos diagnósticos mostramos/devolvemos (el motor solo ordena estos)
+MAX_DIAGNOSTICOS = 5
+
+
+@lru_cache(maxsize=4096)
+def _diagnosticar_cacheado(
+    tipo: TipoDispositivo,
+    sintomas: tuple,
+    intensidad_wifi: Optional[float],
+    fw_actualizado: bool,
+    encendido_largo: bool,
+) -> tuple:
+    """
+    Corre el motor para una combinación de datos y memoiza el resultado.
+    La clave es reglas.clave_diagnostico: solo lo que leen las reglas (el
+    firmware y los días ya reducidos a bool, sin el nombre), así que
+    combinaciones equivalentes comparten entrada y la caché no guarda
+    strings arbitrarios del cliente.
+    Devuelve (diagnosticos, criticidad, recomendacion); criticidad y
+    recomendacion son None si no hubo diagnósticos.
+    """
+    # dispositivo representativo de la clave (mismo contexto para las reglas)
+    dispositivo = DispositivoInput.model_construct(
+        nombre="_",
+        tipo=tipo,
+        sintomas=list(sintomas),
+        intensidad_señal_wifi=intensidad_wifi,
+        ultima_actualizacion_firmware="actualizado" if fw_actualizado else None,
+        tiempo_encendido_dias=DIAS_ENCENDIDO_LARGO + 1 if encendido_largo else None,
+    )
+    diagnosticos = base_conocimiento.obtener_diagnosticos(dispositivo, top_k=MAX_DIAGNOSTICOS)
+    if not diagnosticos:
+        return (), None, None
+    criticidad = base_conocimiento.calcular_criticidad(dispositivo, diagnosticos)
+    recomendacion = _formatear_recomendacion(
+        diagnosticos[0], criticidad == NivelCriticidad.CRITICA
+    )
+    return tuple(diagnosticos), criticidad, recomendacion
+
+
+def _formatear_recomendacion(diag_principal, requiere_alerta: bool) -> str:
+    """
+    "[CATEGORIA] solución", con prefijo de urgencia si hay alerta.
+    """
+    prefijo = "⚠️ URGENTE: " if requiere_alerta else ""
+    return f"{prefijo}[{diag_principal.categoria.value.upper()}] {diag_principal.solucion}"
+
+
+def _run_diagnostic(dispositivo: DispositivoInput) -> Optional[tuple]:
+    """
+    Diagnóstico completo de un dispositivo:
+    (diagnosticos, criticidad, recomendacion, requiere_alerta, caso_para_log).
+    Devuelve None si el motor no encontró ningún diagnóstico.
+    """
+    diagnosticos, criticidad, recomendacion = _diagnosticar_cacheado(
+        *clave_diagnostico(dispositivo)
+    )
+    if not diagnosticos:
+        return None
+
+    requiere_alerta = (criticidad == NivelCriticidad.CRITICA)
+    diag_principal = diagnosticos[0]
+
+    # DispositivoInput garantiza enums en tipo/sintomas: .value directo
+    caso = {
+        "nombre": dispositivo.nombre,
+        "fecha": datetime.now().isoformat(sep=" ", timespec="minutes"),  # "AAAA-MM-DD HH:MM"
+        "tipo_dispositivo": dispositivo.tipo.value,
+        "sintomas": [s.value for s in dispositivo.sintomas],
+        "categoria_top": diag_principal.categoria.value,
+        "criticidad": criticidad.value,
     }
-    return descripciones.get(sintoma, "Sin descripción.")
+    return list(diagnosticos), criticidad, recomendacion, requiere_alerta, caso
 
 
 # -------------------------------------------------------------------
@@ -172,7 +823,7 @@ def obtener_descripcion_sintoma(sintoma: Sintoma) -> str:
 # -------------------------------------------------------------------
 
 @app.post("/diagnosticar", response_model=Resultado)
-def diagnosticar_dispositivo(dispositivo: DispositivoInput):
+async def diagnosticar_dispositivo(dispositivo: DispositivoInput):
     """
     Endpoint técnico (JSON IN → JSON OUT)
     - Recibe un dispositivo con síntomas.
@@ -186,87 +837,76 @@ def diagnosticar_dispositivo(dispositivo: DispositivoInput):
             detail="Debe proporcionar al menos un síntoma."
         )
 
-    diagnosticos = base_conocimiento.obtener_diagnosticos(dispositivo)
-    if not diagnosticos:
+    diagnostico = _run_diagnostic(dispositivo)
+    if diagnostico is None:
         raise HTTPException(
             status_code=404,
             detail="No se encontraron diagnósticos para los síntomas."
         )
+    diagnosticos, criticidad, recomendacion, requiere_alerta, caso = diagnostico
 
-    criticidad = base_conocimiento.calcular_criticidad(dispositivo, diagnosticos)
-    requiere_alerta = (criticidad == NivelCriticidad.CRITICA)
-
-    diag_principal = diagnosticos[0]
-    recomendacion = f"[{diag_principal.categoria.value.upper()}] {diag_principal.solucion}"
-    if requiere_alerta:
-        recomendacion = f"⚠️ URGENTE: {recomendacion}"
-
-    # Guardamos el caso para /stats y /casos
+    # Guardamos el caso para /stats y /casos (encolado, se escribe en segundo plano)
     try:
-        _append_case({
-            "nombre": dispositivo.nombre,
-            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "tipo_dispositivo": getattr(dispositivo.tipo, "value", str(dispositivo.tipo)),
-            "sintomas": [getattr(s, "value", str(s)) for s in dispositivo.sintomas],
-            "categoria_top": getattr(diagnosticos[0].categoria, "value", None) if diagnosticos else None,
-            "criticidad": getattr(criticidad, "value", str(criticidad)),
-        })
+        await _registrar_casos([caso])
     except Exception:
         # si falla el log, seguimos igual (no rompemos el diagnóstico)
         pass
 
-    return Resultado(
-        dispositivo=dispositivo.nombre,
-        tipo=dispositivo.tipo,
-        criticidad=criticidad,
-        diagnosticos=diagnosticos[:5],
-        recomendacion_principal=recomendacion,
-        requiere_alerta=requiere_alerta,
-    )
+    # Devolvemos el JSON armado a mano: una Response saltea la validación y
+    # el jsonable_encoder de FastAPI. response_model=Resultado queda solo
+    # para documentar el esquema en /docs (mismas claves que Resultado).
+    return ORJSONResponse({
+        "dispositivo": dispositivo.nombre,
+        "tipo": dispositivo.tipo.value,
+        "criticidad": criticidad.value,
+        "diagnosticos": [
+            {
+                "causa": d.causa,
+                "categoria": d.categoria.value,
+                "probabilidad": d.probabilidad,
+                "solucion": d.solucion,
+            }
+            for d in diagnosticos
+        ],
+        "recomendacion_principal": recomendacion,
+        "requiere_alerta": requiere_alerta,
+        "timestamp": datetime.now().isoformat(),
+    })
 
 
 @app.post("/diagnosticar/lote")
-def diagnosticar_lote(items: List[DispositivoInput]):
+async def diagnosticar_lote(items: List[DispositivoInput]):
     """
     Endpoint batch:
     - Recibe una lista de dispositivos.
     - Devuelve una lista de diagnósticos resumidos.
-    - Loguea cada caso.
+    - Loguea todos los casos juntos al final (una sola escritura).
     """
     resultados = []
+    nuevos_casos = []
 
     for dispositivo in items:
-        diagnosticos = base_conocimiento.obtener_diagnosticos(dispositivo)
-        if not diagnosticos:
+        diagnostico = _run_diagnostic(dispositivo)
+        if diagnostico is None:
             continue
+        _, criticidad, recomendacion, requiere_alerta, caso = diagnostico
 
-        criticidad = base_conocimiento.calcular_criticidad(dispositivo, diagnosticos)
-        requiere_alerta = (criticidad == NivelCriticidad.CRITICA)
-
-        diag_principal = diagnosticos[0]
-        recomendacion = f"[{diag_principal.categoria.value.upper()}] {diag_principal.solucion}"
-        if requiere_alerta:
-            recomendacion = f"⚠️ URGENTE: {recomendacion}"
-
-        # log de caso
-        try:
-            _append_case({
-                "tipo_dispositivo": getattr(dispositivo.tipo, "value", str(dispositivo.tipo)),
-                "sintomas": [getattr(s, "value", str(s)) for s in dispositivo.sintomas],
-                "categoria_top": getattr(diagnosticos[0].categoria, "value", None) if diagnosticos else None,
-                "criticidad": getattr(criticidad, "value", str(criticidad)),
-            })
-        except Exception:
-            pass
+        # caso a loguear (se escriben todos juntos al final)
+        nuevos_casos.append(caso)
 
         resultados.append({
             "dispositivo": dispositivo.nombre,
-            "tipo": dispositivo.tipo.value if hasattr(dispositivo.tipo, "value") else str(dispositivo.tipo),
-            "criticidad": getattr(criticidad, "value", str(criticidad)),
+            "tipo": dispositivo.tipo.value,
+            "criticidad": criticidad.value,
             "recomendacion_principal": recomendacion,
             "requiere_alerta": requiere_alerta,
         })
 
+    try:
+        await _registrar_casos(nuevos_casos)
+    except Exception:
+        pass
+
     return {
         "procesados": len(resultados),
         "resultados": resultados,
@@ -278,16 +918,7 @@ def listar_sintomas():
     """
     Devuelve lista de síntomas posibles (para usar en front, selects, etc.).
     """
-    return {
-        "sintomas": [
-            {
-                "valor": s.value,
-                "nombre": s.name,
-                "descripcion": obtener_descripcion_sintoma(s),
-            }
-            for s in Sintoma
-        ]
-    }
+    return Response(content=SINTOMAS_JSON, media_type="application/json")
 
 
 @app.get("/dispositivos")
@@ -295,58 +926,72 @@ def listar_dispositivos():
     """
     Devuelve lista de tipos de dispositivos posibles.
     """
-    return {
-        "dispositivos": [
-            {"tipo": t.value, "nombre": t.name}
-            for t in TipoDispositivo
-        ]
-    }
+    return Response(content=DISPOSITIVOS_JSON, media_type="application/json")
 
 
 # -------------------------------------------------------------------
 # API para métricas (la consume stats.html con fetch("/api/stats"))
 # -------------------------------------------------------------------
+def _stats_body() -> bytes:
+    """
+    JSON de /api/stats (cacheado hasta la próxima alta/baja de caso).
+    Solo se ordenan los top-K; categoría y criticidad tienen pocas claves
+    y van completas sin ordenar.
+    """
+    # bajo el lock: los appends (en threads) suman a los mismos Counter
+    # y no se pueden iterar mientras cambian de tamaño
+    with _CASES_LOCK:
+        body = _RESPUESTAS["stats"]
+        if body is None:
+            body = orjson.dumps({
+                "n_casos": _STATS["n"],
+                "by_device": dict(_STATS["by_device"].most_common(10)),
+                "by_symptom": dict(_STATS["by_symptom"].most_common(15)),
+                "by_category": dict(_STATS["by_category"]),
+                "by_criticidad": dict(_STATS["by_criticidad"]),
+            })
+            _RESPUESTAS["stats"] = body
+    return body
+
+
+def _casos_body() -> bytes:
+    """
+    JSON de /api/casos (cacheado mientras no cambie la firma del archivo).
+    """
+    with _CASES_LOCK:
+        casos = _read_cases()
+        key = _file_key(CASES_PATH)
+        cacheado = _RESPUESTAS["casos"]
+        if cacheado is not None and cacheado[0] == key:
+            body = cacheado[1]
+        else:
+            body = orjson.dumps(casos)
+            _RESPUESTAS["casos"] = (key, body)
+    return body
+
+
 @app.get("/api/stats")
-def api_stats():
-    casos = _read_json_safe(CASES_PATH, default=[])
-
-    by_device = Counter()
-    by_symptom = Counter()
-    by_category = Counter()
-    by_criticidad = Counter()
-
-    for c in casos:
-        td = c.get("tipo_dispositivo")
-        if td:
-            by_device[td] += 1
-
-        for s in c.get("sintomas", []):
-            by_symptom[s] += 1
-
-        cat = c.get("categoria_top")
-        if cat:
-            by_category[cat] += 1
-
-        crit = c.get("criticidad")
-        if crit:
-            by_criticidad[crit] += 1
-
-    return JSONResponse({
-        "n_casos": len(casos),
-        "by_device": dict(by_device.most_common(10)),
-        "by_symptom": dict(by_symptom.most_common(15)),
-        "by_category": dict(by_category.most_common()),
-        "by_criticidad": dict(by_criticidad.most_common()),
-    })
+async def api_stats():
+    """
+    Métricas agregadas del historial (mantenidas en memoria por _STATS).
+    Con la respuesta ya cacheada no se toca el lock ni un thread; si hay
+    que armarla, se hace en un thread (el lock puede estar tomado por un
+    append escribiendo a disco y no queremos bloquear el event loop).
+    """
+    body = _RESPUESTAS["stats"]
+    if body is None:
+        body = await anyio.to_thread.run_sync(_stats_body)
+    return Response(content=body, media_type="application/json")
 
 
 @app.get("/api/casos")
-def api_listar_casos():
+async def api_listar_casos():
     """
     Devuelve el JSON crudo de casos guardados.
     Útil para debug sin UI.
     """
-    return _read_json_safe(CASES_PATH, default=[])
+    body = await anyio.to_thread.run_sync(_casos_body)
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/reset-casos")
@@ -355,7 +1000,10 @@ def reset_casos():
     Borra TODOS los casos registrados.
     Se usa desde la UI cuando tocás "🗑️ Limpiar casos".
     """
-    atomic_write_json(CASES_PATH, [])
+    with _CASES_LOCK:
+        _COLA_CASOS.clear()  # lo pendiente de escribir también se descarta
+        _write_cases([])
+        _stats_reset()
     return {"mensaje": "Casos eliminados correctamente"}
 
 
@@ -365,13 +1013,16 @@ def delete_caso(idx: int):
     Elimina UN caso puntual por índice 1-based (el número que ves en la tabla).
     """
     try:
-        casos = _read_json_safe(CASES_PATH, default=[])
-        real_index = idx - 1  # porque en pantalla mostramos desde 1
-        if real_index < 0 or real_index >= len(casos):
-            raise HTTPException(status_code=404, detail="Caso no encontrado")
+        with _CASES_LOCK:  # leer-modificar-escribir sin appends en el medio
+            _vaciar_cola_casos()  # que el historial incluya lo encolado
+            casos = list(_read_cases())  # copia: no tocar la caché si falla la escritura
+            real_index = idx - 1  # porque en pantalla mostramos desde 1
+            if real_index < 0 or real_index >= len(casos):
+                raise HTTPException(status_code=404, detail="Caso no encontrado")
 
-        casos.pop(real_index)
-        atomic_write_json(CASES_PATH, casos)
+            eliminado = casos.pop(real_index)
+            _write_cases(casos)
+            _stats_restar(eliminado)
 
         return {"ok": True, "msg": f"Caso {idx} eliminado"}
     except Exception as e:
@@ -416,16 +1067,6 @@ def admin_sintoma_nuevo(
             status_code=303,
         )
 
-    kb = read_kb()
-    kb["sintomas"].setdefault(codigo, {"causas": []})
-
-    # Intentar ver si ya existe esa causa para ese síntoma
-    existente = None
-    for c in kb["sintomas"][codigo]["causas"]:
-        if c.get("causa", "").strip().lower() == causa.strip().lower():
-            existente = c
-            break
-
     nueva = {
         "causa": causa.strip(),
         "categoria": categoria,
@@ -433,55 +1074,76 @@ def admin_sintoma_nuevo(
         "solucion": solucion.strip(),
     }
 
-    if existente:
-        existente.update(nueva)
-    else:
-        kb["sintomas"][codigo]["causas"].append(nueva)
-
-    write_kb(kb)
+    with _KB_LOCK:
+        kb = read_kb()
+        causas = kb["sintomas"].setdefault(codigo, {"causas": []})["causas"]
+        indice = _indice_causas(kb).setdefault(codigo, {})
+
+        # ¿ya existe esa causa para ese síntoma? (lookup en el índice)
+        clave = _normalizar_causa(causa)
+        pos = indice.get(clave)
+        if pos is not None:
+            causas[pos].update(nueva)
+        else:
+            indice[clave] = len(causas)
+            causas.append(nueva)
+
+        write_kb(kb)
     return RedirectResponse(
         "/admin/kb?mensaje=S%C3%ADntoma%20guardado",
         status_code=303,
     )
 
 
+def _guardar_dispositivo(tipo: str, factores: Dict[str, float], sintomas_criticos: List[str]):
+    """
+    Persiste la configuración de un tipo de dispositivo en la KB.
+    """
+    with _KB_LOCK:
+        kb = read_kb()
+        kb["dispositivos"][tipo.strip().upper()] = {
+            "factores": factores,
+            "sintomas_criticos": [s.strip().upper() for s in sintomas_criticos if s.strip()],
+        }
+        write_kb(kb)
+
+
 @app.post("/admin/dispositivo/nuevo")
-def admin_dispositivo_nuevo(
-    tipo: str = Form(...),
-    factores: str = Form(...),
-    sintomas_criticos: Optional[str] = Form(None),
-):
+def admin_dispositivo_nuevo(payload: FactoresDispositivoInput):
     """
     Actualiza/crea configuración por tipo de dispositivo:
     - factores de ajuste de probabilidad por categoría
     - lista de síntomas críticos
+    Recibe JSON (lo manda admin_kb.html con fetch).
     """
-    tipo = tipo.strip().upper()
+    _guardar_dispositivo(payload.tipo, payload.factores, payload.sintomas_criticos)
+    return {"ok": True, "mensaje": "Dispositivo guardado"}
+
 
+@app.post("/admin/dispositivo/nuevo/form", deprecated=True)
+def admin_dispositivo_nuevo_form(
+    tipo: str = Form(...),
+    factores: str = Form(...),
+    sintomas_criticos: Optional[str] = Form(None),
+):
+    """
+    Versión vieja con Form (factores como JSON en texto).
+    Se mantiene por compatibilidad; usar el endpoint JSON.
+    """
     # factores viene como JSON en texto (ej: {"factor_red":1.2,"factor_hardware":1.5})
     try:
-        factores_dict = json.loads(factores)
+        payload = FactoresDispositivoInput(
+            tipo=tipo,
+            factores=orjson.loads(factores),
+            sintomas_criticos=(sintomas_criticos or "").split(","),
+        )
     except Exception:
         return RedirectResponse(
             "/admin/kb?mensaje=Factores%20JSON%20inv%C3%A1lido",
             status_code=303,
         )
 
-    crit_list = []
-    if sintomas_criticos:
-        crit_list = [
-            s.strip().upper()
-            for s in sintomas_criticos.split(",")
-            if s.strip()
-        ]
-
-    kb = read_kb()
-    kb["dispositivos"][tipo] = {
-        "factores": factores_dict,
-        "sintomas_criticos": crit_list,
-    }
-    write_kb(kb)
-
+    _guardar_dispositivo(payload.tipo, payload.factores, payload.sintomas_criticos)
     return RedirectResponse(
         "/admin/kb?mensaje=Dispositivo%20guardado",
         status_code=303,
@@ -528,8 +1190,8 @@ def nuevo_diagnostico(request: Request):
             "index.html",
             {
                 "request": request,
-                "dispositivos": list(TipoDispositivo),
-                "sintomas": list(Sintoma),
+                "dispositivos": TIPOS_LIST,
+                "sintomas": SINTOMAS_LIST,
             },
         )
     except Exception as e:
@@ -541,7 +1203,7 @@ def nuevo_diagnostico(request: Request):
 
 
 @app.post("/resultado", response_class=HTMLResponse)
-def resultado_html(
+async def resultado_html(
     request: Request,
     nombre: str = Form(...),
     tipo: str = Form(...),
@@ -555,14 +1217,16 @@ def resultado_html(
     - Aplica las reglas.
     - Renderiza resultado.html (bonito para el humano).
     """
-    dispositivo = DispositivoInput(
+    # Los enums ya se convierten acá, así que no re-validamos el modelo
+    # (tipo desconocido → primer tipo; síntomas desconocidos se ignoran)
+    dispositivo = DispositivoInput.model_construct(
         nombre=nombre,
-        tipo=TipoDispositivo(tipo),
-        sintomas=[Sintoma(s) for s in (sintomas or [])],
+        tipo=TIPO_POR_VALOR.get(tipo, TIPOS_LIST[0]),
+        sintomas=[SINTOMA_POR_VALOR[s] for s in (sintomas or []) if s in SINTOMA_POR_VALOR],
     )
 
-    diagnosticos = base_conocimiento.obtener_diagnosticos(dispositivo)
-    if not diagnosticos:
+    diagnostico = _run_diagnostic(dispositivo)
+    if diagnostico is None:
         return TEMPLATES.TemplateResponse(
             "resultado.html",
             {
@@ -571,33 +1235,19 @@ def resultado_html(
             },
             status_code=404,
         )
-
-    criticidad = base_conocimiento.calcular_criticidad(dispositivo, diagnosticos)
-    requiere_alerta = (criticidad == NivelCriticidad.CRITICA)
-
-    diag_principal = diagnosticos[0]
-    recomendacion = f"[{diag_principal.categoria.value.upper()}] {diag_principal.solucion}"
-    if requiere_alerta:
-        recomendacion = f"⚠️ URGENTE: {recomendacion}"
+    diagnosticos, criticidad, recomendacion, requiere_alerta, caso = diagnostico
 
     # Guardamos caso también desde el flujo HTML
     try:
-        _append_case({
-            "nombre": dispositivo.nombre,
-            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "tipo_dispositivo": dispositivo.tipo.value,
-            "sintomas": [s.value for s in dispositivo.sintomas],
-            "categoria_top": diag_principal.categoria.value,
-            "criticidad": criticidad.value,
-        })
+        await _registrar_casos([caso])
     except Exception:
         pass
 
-    resultado = Resultado(
+    resultado = Resultado.model_construct(
         dispositivo=dispositivo.nombre,
         tipo=dispositivo.tipo,
         criticidad=criticidad,
-        diagnosticos=diagnosticos[:5],
+        diagnosticos=diagnosticos,
         recomendacion_principal=recomendacion,
         requiere_alerta=requiere_alerta,
     )
@@ -612,29 +1262,19 @@ def resultado_html(
 
 
 @app.get("/casos/diagnosticados", response_class=HTMLResponse)
-def ver_casos(request: Request):
+async def ver_casos(request: Request):
     """
     Página HTML con la tabla de casos ya diagnosticados.
-    Usa casos.html.
-    """
-    casos = _read_json_safe(CASES_PATH, default=[])
-    tabla = []
-    for i, c in enumerate(casos, start=1):
-        tabla.append({
-            "n": i,
-            "tipo_dispositivo": c.get("tipo_dispositivo") or "—",
-            "sintomas": c.get("sintomas") or [],
-            "categoria_top": c.get("categoria_top") or "—",
-            "criticidad": c.get("criticidad") or "—",
-            "nombre": c.get("nombre") or "",
-            "fecha":  c.get("fecha")  or "",
-        })
-
+    Usa casos.html, que recorre el historial tal cual (numeración y
+    valores por defecto se resuelven en el template).
+    """
+    # la lectura (y el parseo si cambió el archivo) va en un thread
+    casos = await anyio.to_thread.run_sync(_read_cases)
     return TEMPLATES.TemplateResponse(
         "casos.html",
         {
             "request": request,
-            "casos": tabla,
+            "casos": casos,
         },
     )
 
@@ -662,7 +1302,13 @@ def __routes():
     """
     Devuelve todas las rutas registradas (debug).
     """
-    return JSONResponse([getattr(r, "path", None) for r in app.routes])
+    return Response(content=_routes_json(), media_type="application/json")
+
+
+@lru_cache(maxsize=1)
+def _routes_json() -> bytes:
+    # se arma en el primer request, cuando ya están registradas todas las rutas
+    return orjson.dumps([getattr(r, "path", None) for r in app.routes])
 
 
 @app.get("/healthz")
@@ -8,9 +8,11 @@ Acá definimos:
 - Los síntomas que puede reportar el usuario (Sintoma)
 - Las categorías de causa (Causa)
 - El nivel de criticidad (NivelCriticidad)
+- Las tuplas y lookups por valor de esos enums (TIPOS_LIST, TIPO_POR_VALOR, ...)
 - El input que recibe el motor / la API (DispositivoInput)
 - El formato interno de diagnóstico (Diagnostico)
 - El resultado que devolvemos al front / templates (Resultado)
+- La configuración por tipo que carga el admin de la KB (FactoresDispositivoInput)
 
 IMPORTANTE:
 - Estos modelos los importan tanto main.py como reglas.py.
@@ -19,7 +21,7 @@ IMPORTANTE:
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 from datetime import datetime
 
@@ -81,6 +83,16 @@ class NivelCriticidad(str, Enum):
     BAJA = "baja"
 
 
+# Enums fijos: se calculan una sola vez al importar (los usan main.py y
+# interfaz/visual.py para armar los formularios y leer lo que llega).
+TIPOS_LIST = tuple(TipoDispositivo)
+SINTOMAS_LIST = tuple(Sintoma)
+
+# valor del form -> miembro del enum (lookup directo, sin try/except)
+TIPO_POR_VALOR = {t.value: t for t in TIPOS_LIST}
+SINTOMA_POR_VALOR = {s.value: s for s in SINTOMAS_LIST}
+
+
 # -------------------------------------------------------------------
 # MODELOS DE DATOS (Pydantic)
 # -------------------------------------------------------------------
@@ -147,39 +159,43 @@ class Resultado(BaseModel):
     )
 
 
+class FactoresDispositivoInput(BaseModel):
+    """
+    Body JSON de /admin/dispositivo/nuevo.
+    FastAPI lo parsea y valida de una sola vez (sin json.loads manual).
+    """
+
+    tipo: str
+    factores: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Multiplicadores por categoría (ej: {\"factor_red\": 1.2}).",
+    )
+    sintomas_criticos: List[str] = Field(default_factory=list)
+
+
 # -------------------------------------------------------------------
 # COMPATIBILIDAD LEGADA (Alias Sintoma.CORTE_INTERMITENTE)
 # -------------------------------------------------------------------
 
 
-try:
-    # ¿Existe ya el miembro CORTE_INTERMITENTE?
-    _ = Sintoma.CORTE_INTERMITENTE  # noqa: F841
-except AttributeError:
-    # No existe. Buscamos alternativas que podrían estar en tu KB/reglas históricas.
-    candidatos = [
-        "CORTE_INTERMITENTE_WIFI",
-        "INTERMITENCIA",
-        "CORTES_INTERMITENTES",
-        "CORTES",
-        "CORTE",
-    ]
-
-    destino = None
-    for name in candidatos:
-        if hasattr(Sintoma, name):
-            destino = getattr(Sintoma, name)
-            break
-
-    if destino is None:
-        # fallback final: tomar el primer miembro del Enum para no romper import
-        try:
-            destino = list(Sintoma)[0]
-        except Exception:
-            destino = None
-
-    if destino is not None:
-        # Creamos el alias dinámicamente:
-        # Sintoma.CORTE_INTERMITENTE va a apuntar a ese destino.
-        setattr(Sintoma, "CORTE_INTERMITENTE", destino)
-
+# Nombres históricos a los que puede apuntar el alias (en orden de preferencia)
+_CANDIDATOS_CORTE_INTERMITENTE = (
+    "CORTE_INTERMITENTE_WIFI",
+    "INTERMITENCIA",
+    "CORTES_INTERMITENTES",
+    "CORTES",
+    "CORTE",
+)
+
+if not hasattr(Sintoma, "CORTE_INTERMITENTE"):
+    # No existe: apuntamos a la primera alternativa que esté en el Enum o,
+    # como fallback final, al primer miembro (para no romper el import).
+    # Sintoma.CORTE_INTERMITENTE queda como alias de ese miembro.
+    setattr(
+        Sintoma,
+        "CORTE_INTERMITENTE",
+        next(
+            (getattr(Sintoma, n) for n in _CANDIDATOS_CORTE_INTERMITENTE if hasattr(Sintoma, n)),
+            next(iter(Sintoma)),
+        ),
+    )
@@ -0,0 +1,39 @@
+# app/plantillas.py
+#
+# Entorno Jinja2 compartido por main.py e interfaz/visual.py:
+# - bytecode_cache: los templates compilados se guardan en disco, así un
+#   worker nuevo no vuelve a parsear/compilar cada HTML.
+# - auto_reload=False: no se hace stat() del template en cada render.
+#   Con ENV=dev se vuelve a activar para ver cambios en los HTML sin reiniciar.
+import os
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+MODO_DEV = os.getenv("ENV", "").lower() == "dev"
+
+
+def crear_entorno_jinja(template_dir: Path, cache_dir: Path) -> Environment:
+    """
+    Arma el Environment para `template_dir` con bytecode cache en `cache_dir`
+    y deja todos los templates .html ya compilados.
+    Si `cache_dir` no se puede crear/escribir (deploy de solo lectura), se
+    compila en memoria sin bytecode cache.
+    """
+    bytecode_cache = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if os.access(cache_dir, os.W_OK):
+            bytecode_cache = FileSystemBytecodeCache(directory=str(cache_dir))
+    except OSError:
+        pass  # sin permisos de escritura: sin bytecode cache
+    env = Environment(
+        loader=FileSystemLoader(str(template_dir)),
+        autoescape=True,
+        auto_reload=MODO_DEV,
+        bytecode_cache=bytecode_cache,
+    )
+    # precompilar todos los templates al arrancar
+    for nombre in env.list_templates(extensions=["html"]):
+        env.get_template(nombre)
+    return env
@@ -1,9 +1,13 @@
 # app/reglas.py
 from __future__ import annotations
 
-import json
+import heapq
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import orjson
 
 # Importes ABSOLUTOS (sirven en -m y en script si se ejecuta desde la raíz del proyecto)
 from app.modelos import (
@@ -16,19 +20,87 @@ from app.modelos import (
 )
 
 
+class ReglaCompilada(NamedTuple):
+    """Regla de un síntoma ya convertida a tipos nativos (ver build_index)."""
+    causa: str
+    categoria: Causa
+    prob_base: float
+    solucion: str
+
+
+# Tipos donde un síntoma crítico escala directamente a CRITICA
+_TIPOS_SENSIBLES: FrozenSet[TipoDispositivo] = frozenset({
+    TipoDispositivo.CERRADURA_INTELIGENTE,
+    TipoDispositivo.CAMARA_SEGURIDAD,
+    TipoDispositivo.SENSOR_AGUA,
+})
+
+# Clave de orden de los candidatos (probabilidad, causa, categoria, solucion):
+# itemgetter es un callable en C, sin frame de Python por comparación
+_POR_PROBABILIDAD = itemgetter(0)
+
+# Categorías que, con probabilidad alta, suben la criticidad a ALTA
+_CATEGORIAS_FISICAS: FrozenSet[Causa] = frozenset({Causa.ENERGIA, Causa.HARDWARE})
+
+# Clave de factor en reglas_por_dispositivo -> categoría a la que se aplica
+_FACTOR_POR_CATEGORIA: Dict[str, Causa] = {
+    "factor_hardware": Causa.HARDWARE,
+    "factor_red": Causa.RED,
+    "factor_energia": Causa.ENERGIA,
+    "factor_software": Causa.SOFTWARE,
+}
+
+
+# Nombres reales de los campos contextuales de DispositivoInput, resueltos
+# una sola vez (el de señal WiFi puede venir con o sin ñ según la versión).
+_CAMPOS_DISPOSITIVO = set(getattr(DispositivoInput, "model_fields", None) or DispositivoInput.__annotations__)
+_WIFI_ATTR = "intensidad_señal_wifi" if "intensidad_señal_wifi" in _CAMPOS_DISPOSITIVO else "intensidad_senal_wifi"
+_FW_ATTR = "ultima_actualizacion_firmware"
+_DIAS_ATTR = "tiempo_encendido_dias"
+
+# Más de estos días encendido cuenta como "mucho tiempo" (sube HARDWARE)
+DIAS_ENCENDIDO_LARGO = 90
+
+
+def contexto_dispositivo(dispositivo: DispositivoInput) -> Tuple[Optional[float], bool, bool]:
+    """
+    Lo único del contexto que leen las reglas:
+    (intensidad_wifi, fw_actualizado, encendido_largo).
+    """
+    fw = getattr(dispositivo, _FW_ATTR, None)
+    dias_on = getattr(dispositivo, _DIAS_ATTR, None)
+    return (
+        getattr(dispositivo, _WIFI_ATTR, None),
+        isinstance(fw, str) and bool(fw.strip()),
+        bool(dias_on) and dias_on > DIAS_ENCENDIDO_LARGO,
+    )
+
+
+def clave_diagnostico(dispositivo: DispositivoInput) -> tuple:
+    """
+    (tipo, sintomas, intensidad_wifi, fw_actualizado, encendido_largo):
+    dos dispositivos con la misma clave reciben el mismo diagnóstico y la
+    misma criticidad, así que sirve como clave de memoización.
+    """
+    return (dispositivo.tipo, tuple(dispositivo.sintomas), *contexto_dispositivo(dispositivo))
+
+
 class BaseConocimiento:
     def __init__(self, ruta_json: str | Path | None = None) -> None:
         """Inicializa la base de conocimiento desde un archivo JSON."""
         self.reglas: Dict[str, list] = {}
         self.reglas_dispositivo: Dict[str, dict] = {}
+        # Índices derivados (ver build_index)
+        self._por_sintoma: Dict[Sintoma, Tuple[ReglaCompilada, ...]] = {}
+        self._criticos_por_tipo: Dict[TipoDispositivo, FrozenSet[Sintoma]] = {}
+        self.factores_por_tipo: Dict[TipoDispositivo, Dict[Causa, float]] = {}
 
         try:
             if ruta_json is None:
                 ruta_json = Path(__file__).resolve().parent / "data" / "base_conocimiento.json"
             ruta_json = Path(ruta_json)
 
-            with ruta_json.open("r", encoding="utf-8") as f:
-                conocimiento: Dict[str, Any] = json.load(f)
+            conocimiento: Dict[str, Any] = orjson.loads(ruta_json.read_bytes())
 
             self.reglas = conocimiento.get("reglas_por_sintoma", {}) or {}
             self.reglas_dispositivo = conocimiento.get("reglas_por_dispositivo", {}) or {}
@@ -39,85 +111,145 @@ class BaseConocimiento:
             self.reglas = {}
             self.reglas_dispositivo = {}
 
-    # ------------------------------------------------------------------
-    # Motor de inferencia
-    # ------------------------------------------------------------------
-    def obtener_diagnosticos(self, dispositivo: DispositivoInput) -> List[Diagnostico]:
-        """Genera una lista de diagnósticos basados en los síntomas del dispositivo."""
-        diagnosticos_raw: List[Diagnostico] = []
-
-        # Soporte con/sin ñ
-        intensidad_wifi: Optional[float] = getattr(dispositivo, "intensidad_señal_wifi", None)
-        if intensidad_wifi is None:
-            intensidad_wifi = getattr(dispositivo, "intensidad_senal_wifi", None)
-
-        reglas_disp: Dict[str, Any] = self.reglas_dispositivo.get(dispositivo.tipo.value, {}) or {}
-
-        for sintoma_enum in dispositivo.sintomas:
-            sintoma_str = getattr(sintoma_enum, "value", str(sintoma_enum))
-            reglas_sintoma = self.reglas.get(sintoma_str, [])
-
-            for regla in reglas_sintoma:
-                try:
-                    prob_base = float(regla.get("probabilidad_base", 0))
-                except Exception:
-                    prob_base = 0.0
+        self.build_index()
+
+    def build_index(self) -> None:
+        """
+        Arma los índices que usa el motor a partir de reglas/reglas_dispositivo:
+        - síntoma (enum) -> ReglaCompilada (causa, categoria, prob_base, solucion),
+          con los tipos convertidos y las categorías inválidas descartadas una sola vez
+        - tipo (enum) -> síntomas críticos como frozenset de Sintoma
+        - tipo (enum) -> {Causa: factor} ya convertido a float
+        Volver a llamarlo si se modifican self.reglas o self.reglas_dispositivo.
+        """
+        self._por_sintoma = {
+            s: tuple(self._compilar_reglas(self.reglas.get(s.value, []) or []))
+            for s in Sintoma
+        }
+        por_valor = {s.value: s for s in Sintoma}
+        self._criticos_por_tipo = {
+            t: frozenset(
+                por_valor[v]
+                for v in (self.reglas_dispositivo.get(t.value, {}) or {}).get("sintomas_criticos", []) or []
+                if v in por_valor
+            )
+            for t in TipoDispositivo
+        }
+        self.factores_por_tipo = {
+            t: self._compilar_factores(self.reglas_dispositivo.get(t.value, {}) or {})
+            for t in TipoDispositivo
+        }
 
+    @staticmethod
+    def _compilar_reglas(reglas: List[dict]) -> List[ReglaCompilada]:
+        """Convierte las reglas crudas del JSON en ReglaCompilada listas para el motor."""
+        compiladas: List[ReglaCompilada] = []
+        for regla in reglas:
+            try:
+                prob_base = float(regla.get("probabilidad_base", 0))
+            except Exception:
+                prob_base = 0.0
+
+            try:
+                categoria = Causa(regla.get("categoria", ""))
+            except Exception:
+                # Categoría desconocida: se ignora la regla
+                continue
+
+            compiladas.append(ReglaCompilada(
+                causa=str(regla.get("causa", "desconocida")),
+                categoria=categoria,
+                prob_base=prob_base,
+                solucion=str(regla.get("solucion", "")),
+            ))
+        return compiladas
+
+    @staticmethod
+    def _compilar_factores(reglas_disp: Dict[str, Any]) -> Dict[Causa, float]:
+        """Traduce factor_hardware/factor_red/... a un dict {Causa: float}."""
+        factores: Dict[Causa, float] = {}
+        for clave, categoria in _FACTOR_POR_CATEGORIA.items():
+            if clave in reglas_disp:
                 try:
-                    categoria = Causa(regla.get("categoria", ""))
+                    factores[categoria] = float(reglas_disp[clave])
                 except Exception:
-                    # Categoría desconocida: se ignora la regla
+                    # Factor no numérico: se ignora
                     continue
+        return factores
 
-                probabilidad_ajustada = prob_base
-
-                # Factores por tipo de dispositivo
-                if categoria == Causa.HARDWARE and "factor_hardware" in reglas_disp:
-                    probabilidad_ajustada *= float(reglas_disp["factor_hardware"])
-                elif categoria == Causa.RED and "factor_red" in reglas_disp:
-                    probabilidad_ajustada *= float(reglas_disp["factor_red"])
-                elif categoria == Causa.ENERGIA and "factor_energia" in reglas_disp:
-                    probabilidad_ajustada *= float(reglas_disp["factor_energia"])
-                elif categoria == Causa.SOFTWARE and "factor_software" in reglas_disp:
-                    probabilidad_ajustada *= float(reglas_disp["factor_software"])
-
-                # Señal WiFi (solo afecta a RED)
-                if categoria == Causa.RED and intensidad_wifi is not None:
-                    if intensidad_wifi < -80:
-                        probabilidad_ajustada *= 1.3
-                    elif intensidad_wifi > -60:
-                        probabilidad_ajustada *= 0.7
-
-                # Firmware actualizado reduce probabilidad de SOFTWARE
-                fw = getattr(dispositivo, "ultima_actualizacion_firmware", None)
-                if categoria == Causa.SOFTWARE and isinstance(fw, str) and fw.strip():
-                    probabilidad_ajustada *= 0.9
-
-
-
-                # Mucho tiempo encendido aumenta HARDWARE
-                dias_on = getattr(dispositivo, "tiempo_encendido_dias", None)
-                if categoria == Causa.HARDWARE and dias_on and dias_on > 90:
-                    probabilidad_ajustada *= 1.2
-
-                diagnosticos_raw.append(
-                    Diagnostico(
-                        causa=str(regla.get("causa", "desconocida")),
-                        categoria=categoria,
-                        probabilidad=min(max(round(probabilidad_ajustada, 2), 0.0), 100.0),
-                        solucion=str(regla.get("solucion", "")),
-                    )
-                )
-
-        # Deduplicar por causa: conservar la MAYOR probabilidad
-        mejores_por_causa: Dict[str, Diagnostico] = {}
-        for d in diagnosticos_raw:
-            previo = mejores_por_causa.get(d.causa)
-            if previo is None or d.probabilidad > previo.probabilidad:
-                mejores_por_causa[d.causa] = d
-
-        # Ordenar descendente por probabilidad
-        return sorted(mejores_por_causa.values(), key=lambda x: x.probabilidad, reverse=True)
+    # ------------------------------------------------------------------
+    # Motor de inferencia
+    # ------------------------------------------------------------------
+    def obtener_diagnosticos(
+        self, dispositivo: DispositivoInput, top_k: Optional[int] = None
+    ) -> List[Diagnostico]:
+        """
+        Genera una lista de diagnósticos basados en los síntomas del dispositivo,
+        ordenada de mayor a menor probabilidad. Con top_k devuelve solo los
+        primeros top_k (mismo resultado que ordenar todo y cortar).
+        """
+        # Preselección: solo los síntomas que tienen reglas. Si ninguno tiene,
+        # no hay nada que evaluar y se evita todo el cálculo de ajustes.
+        reglas_activas = [r for s in dispositivo.sintomas if (r := self._por_sintoma.get(s))]
+        if not reglas_activas:
+            return []
+
+        # causa -> (probabilidad, causa, categoria, solucion) de la mejor regla vista
+        mejores_por_causa: Dict[str, Tuple[float, str, Causa, str]] = {}
+
+        # Datos contextuales: se leen una sola vez, fuera del loop de reglas
+        intensidad_wifi, fw_actualizado, encendido_largo = contexto_dispositivo(dispositivo)
+
+        # Ajuste total por categoría (factor del tipo × contexto), calculado una
+        # sola vez por llamada: en el loop queda una multiplicación por regla.
+        factores = self.factores_por_tipo.get(dispositivo.tipo, {})
+        ajuste: Dict[Causa, float] = {c: factores.get(c, 1.0) for c in Causa}
+
+        # Señal WiFi (solo afecta a RED)
+        if intensidad_wifi is not None:
+            if intensidad_wifi < -80:
+                ajuste[Causa.RED] *= 1.3
+            elif intensidad_wifi > -60:
+                ajuste[Causa.RED] *= 0.7
+
+        # Firmware actualizado reduce probabilidad de SOFTWARE
+        if fw_actualizado:
+            ajuste[Causa.SOFTWARE] *= 0.9
+
+        # Mucho tiempo encendido aumenta HARDWARE
+        if encendido_largo:
+            ajuste[Causa.HARDWARE] *= 1.2
+
+        for reglas_sintoma in reglas_activas:
+            # ReglaCompilada es una tupla: se desempaqueta sin lookups de atributo
+            for causa, categoria, prob_base, solucion in reglas_sintoma:
+                # Redondeo a 2 decimales y recorte a [0, 100] (comparaciones inline)
+                probabilidad = round(prob_base * ajuste[categoria], 2)
+                if probabilidad > 100.0:
+                    probabilidad = 100.0
+                elif probabilidad < 0.0:
+                    probabilidad = 0.0
+
+                # Deduplicar por causa sobre la marcha: conservar la MAYOR probabilidad
+                previo = mejores_por_causa.get(causa)
+                if previo is None or probabilidad > previo[0]:
+                    mejores_por_causa[causa] = (probabilidad, causa, categoria, solucion)
+
+        # Ordenar descendente por probabilidad (sobre tuplas, todavía sin modelos)
+        if top_k is not None:
+            ganadores = heapq.nlargest(top_k, mejores_por_causa.values(), key=_POR_PROBABILIDAD)
+        else:
+            ganadores = sorted(mejores_por_causa.values(), key=_POR_PROBABILIDAD, reverse=True)
+
+        # Solo se construyen los Diagnostico que se devuelven. model_construct
+        # no revalida: los tipos ya vienen garantizados por ReglaCompilada y
+        # la probabilidad ya está recortada a [0, 100].
+        return [
+            Diagnostico.model_construct(
+                causa=causa, categoria=categoria, probabilidad=probabilidad, solucion=solucion
+            )
+            for probabilidad, causa, categoria, solucion in ganadores
+        ]
 
     # ------------------------------------------------------------------
     # Cálculo de criticidad
@@ -126,16 +258,11 @@ class BaseConocimiento:
         self, dispositivo: DispositivoInput, diagnosticos: List[Diagnostico]
     ) -> NivelCriticidad:
         """Determina el nivel de criticidad de un diagnóstico."""
-        reglas_disp = self.reglas_dispositivo.get(dispositivo.tipo.value, {}) or {}
-        sintomas_criticos = reglas_disp.get("sintomas_criticos", []) or []
-
-        # 1) Síntomas críticos por tipo de dispositivo
-        if any(getattr(s, "value", str(s)) in sintomas_criticos for s in dispositivo.sintomas):
-            if dispositivo.tipo in [
-                TipoDispositivo.CERRADURA_INTELIGENTE,
-                TipoDispositivo.CAMARA_SEGURIDAD,
-                TipoDispositivo.SENSOR_AGUA,
-            ]:
+        sintomas_criticos = self._criticos_por_tipo.get(dispositivo.tipo, frozenset())
+
+        # 1) Síntomas críticos por tipo de dispositivo (intersección de sets)
+        if not sintomas_criticos.isdisjoint(dispositivo.sintomas):
+            if dispositivo.tipo in _TIPOS_SENSIBLES:
                 return NivelCriticidad.CRITICA
             return NivelCriticidad.ALTA
 
@@ -143,7 +270,7 @@ class BaseConocimiento:
         if diagnosticos:
             top = diagnosticos[0]
             if top.probabilidad > 80:
-                if top.categoria in (Causa.ENERGIA, Causa.HARDWARE):
+                if top.categoria in _CATEGORIAS_FISICAS:
                     return NivelCriticidad.ALTA
                 return NivelCriticidad.MEDIA
 
@@ -156,6 +283,16 @@ class BaseConocimiento:
         return NivelCriticidad.BAJA
 
 
+@lru_cache(maxsize=None)
+def get_base_conocimiento(ruta_json: str | Path | None = None) -> BaseConocimiento:
+    """
+    Instancia compartida de BaseConocimiento por ruta: el JSON se lee y se
+    compila una sola vez por proceso. La instancia es compartida, así que no
+    se deben modificar sus reglas después de cargarla.
+    """
+    return BaseConocimiento(ruta_json)
+
+
 # ----------------------------------------------------------------------
 # Smoke test: ejecutar desde la RAÍZ del proyecto
 #   - python -m app.reglas     (recomendado)
@@ -200,11 +337,10 @@ if __name__ == "__main__":
         diags = base.obtener_diagnosticos(dispositivo_demo)
         print("🔎 Diagnósticos (top 5):")
         for d in diags[:5]:
-            cat = getattr(d.categoria, "value", d.categoria)
-            print(f" - {d.causa} | {cat} | {d.probabilidad}%")
+            print(f" - {d.causa} | {d.categoria.value} | {d.probabilidad}%")
 
         crit = base.calcular_criticidad(dispositivo_demo, diags)
-        print(f"📶 Criticidad: {getattr(crit, 'value', crit)}")
+        print(f"📶 Criticidad: {crit.value}")
 
     except Exception as e:
         # Apoyo: mostrar miembros reales y campos del modelo